@@ -1,21 +1,108 @@
 import os
+import re
+import copy
 import json
+import logging
 import uuid
 import time
 import base64
+import queue
+from binascii import b2a_base64
+import asyncio
+import threading
+from datetime import datetime, timedelta
 from io import BytesIO
 from typing import Dict, Any, Optional, List, Tuple, Union
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from PIL import Image
 import requests
+from requests.adapters import HTTPAdapter, Retry
 from loguru import logger
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pybase64
+except ImportError:
+    pybase64 = None
+
+# base64编解码入口：pybase64可用时走SIMD向量化实现，多MB图片快数倍
+if pybase64 is not None:
+    _b64decode = pybase64.b64decode
+
+    def _b64encode_ascii(data: bytes) -> str:
+        return pybase64.b64encode_as_string(data)
+else:
+    _b64decode = base64.b64decode
+
+    def _b64encode_ascii(data: bytes) -> str:
+        # b2a_base64同为C实现但比b64encode少一次中间拷贝；
+        # 输出是纯base64，按ASCII解码更快
+        return b2a_base64(data, newline=False).decode("ascii")
+
+# JSON编解码入口：请求体内嵌多MB的base64图片，orjson可用时编解码快数倍
+if orjson is not None:
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def _json_loads(data):
+        return orjson.loads(data)
+else:
+    def _json_dumps(obj) -> bytes:
+        # 紧凑分隔符省去空白填充，base64大字段不做ASCII转义
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def _json_loads(data):
+        return json.loads(data)
+
+# API调用的异常分类，aiohttp可用时同时兼容两套异常体系
+if aiohttp is not None:
+    SSL_ERRORS = (requests.exceptions.SSLError, aiohttp.ClientSSLError)
+    CONNECTION_ERRORS = (requests.exceptions.ConnectionError, aiohttp.ClientConnectionError)
+    TIMEOUT_ERRORS = (requests.exceptions.Timeout, asyncio.TimeoutError)
+else:
+    SSL_ERRORS = (requests.exceptions.SSLError,)
+    CONNECTION_ERRORS = (requests.exceptions.ConnectionError,)
+    TIMEOUT_ERRORS = (requests.exceptions.Timeout,)
+
 import plugins
 from bridge.context import ContextType
 from bridge.reply import Reply, ReplyType
 from plugins import *
 
+# 发送者ID探测的属性名；优先属性不可用时再尝试群聊回退属性
+_PRIMARY_USER_ID_ATTRS = ("actual_user_id", "from_user_id")
+_GROUP_USER_ID_ATTRS = ("sender_id", "sender_wxid", "self_display_name")
+_DEBUG_USER_ID_ATTRS = ("from_user_id", "actual_user_id", "sender_id", "sender_wxid",
+                        "from_user_nickname", "self_display_name", "other_user_id")
+
+
+def _sniff_image_format(data: bytes) -> Optional[str]:
+    """通过文件头魔数识别常见图片格式，识别不了返回None"""
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"GIF8":
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:2] == b"BM":
+        return "bmp"
+    return None
+
+
 @plugins.register(
     name="GeminiImage",
     desire_priority=20,
@@ -39,6 +126,7 @@ class GeminiImage(Plugin):
         "enable": True,
         "gemini_api_key": "",
         "model": "gemini-2.0-flash-exp-image-generation",
+        "candidate_count": 1,
         "commands": ["$生成图片", "$画图", "$图片生成"],
         "edit_commands": ["$编辑图片", "$修改图片"],
         "exit_commands": ["$结束对话", "$退出对话", "$关闭对话", "$结束"],
@@ -51,6 +139,40 @@ class GeminiImage(Plugin):
         "base_url": "https://generativelanguage.googleapis.com",
     }
 
+    # 文件名净化映射表，单次translate替代逐字符的多趟replace
+    _SAFE_FN_TABLE = str.maketrans({"/": "_", "\\": "_", ":": "_", "*": "_", "\n": "_", "\r": "_"})
+
+    # API消息分类正则：一趟扫描收齐所有关键词，替代逐关键词的多趟in扫描
+    _REASON_RE = re.compile(
+        r"(?P<finish>finishReason)"
+        r"|(?P<safety>IMAGE_SAFETY)"
+        r"|(?P<unable>I'm unable to create this image)"
+        r"|(?P<sexual>sexually suggestive)"
+        r"|(?P<harm>harmful|dangerous)"
+        r"|(?P<violent>violent)"
+        r"|(?P<cannot>cannot generate|can't generate)"
+        r"|(?P<policy>against our content policy)"
+    )
+
+    # 翻译规则表：(命中组集合, 译文)，按优先级排列；新增规则只改数据不改控制流
+    _TRANSLATE_RULES = (
+        (frozenset({"finish", "safety"}), "抱歉，您的请求可能违反了内容安全政策，无法生成或编辑图片。请尝试修改您的描述，提供更为安全、合规的内容。"),
+        (frozenset({"finish"}), "抱歉，图片处理失败，请尝试其他描述或稍后再试。"),
+        (frozenset({"unable", "sexual"}), "抱歉，我无法创建这张图片。我不能生成带有性暗示或促进有害刻板印象的内容。请提供其他描述。"),
+        (frozenset({"unable", "harm"}), "抱歉，我无法创建这张图片。我不能生成可能有害或危险的内容。请提供其他描述。"),
+        (frozenset({"unable", "violent"}), "抱歉，我无法创建这张图片。我不能生成暴力或血腥的内容。请提供其他描述。"),
+        (frozenset({"unable"}), "抱歉，我无法创建这张图片。请尝试修改您的描述，提供其他内容。"),
+        (frozenset({"cannot"}), "抱歉，我无法生成符合您描述的图片。请尝试其他描述。"),
+        (frozenset({"policy"}), "抱歉，您的请求违反了内容政策，无法生成相关图片。请提供其他描述。"),
+    )
+
+    # 所有插件实例共享的asyncio事件循环，运行在后台守护线程中
+    _async_loop = None
+    _async_loop_lock = threading.Lock()
+
+    # 配置模板解析结果缓存，重复加载不再读盘
+    _config_template_cache = None
+
     def __init__(self):
         """初始化插件配置"""
         try:
@@ -70,35 +192,119 @@ class GeminiImage(Plugin):
             self.enable = self.config.get("enable", True)
             self.api_key = self.config.get("gemini_api_key", "")
             self.model = self.config.get("model", "gemini-2.0-flash-exp-image-generation")
-            
+
+            # 单次生图请求的候选数量，大于1时一次请求批量返回多张图片
+            self.candidate_count = self.config.get("candidate_count", 1)
+
             # 获取命令配置
             self.commands = self.config.get("commands", ["#生成图片", "#画图", "#图片生成"])
             self.edit_commands = self.config.get("edit_commands", ["#编辑图片", "#修改图片"])
             self.exit_commands = self.config.get("exit_commands", ["#结束对话", "#退出对话", "#关闭对话", "#结束"])
-            
+
+            # 预编译命令匹配，单次正则匹配替代逐条startswith扫描
+            self._generate_cmd_re = self._compile_command_re(self.commands)
+            self._edit_cmd_re = self._compile_command_re(self.edit_commands)
+            self._exit_command_set = frozenset(self.exit_commands)
+            # 所有命令的首字符集合，用于非命令消息的快速短路
+            self._cmd_first_chars = frozenset(c[:1] for c in self.commands + self.edit_commands + self.exit_commands)
+
+            # 帮助文本只依赖命令配置，初始化时一次拼好
+            self._help_text_brief = (
+                "基于Google Gemini的图像生成插件\n"
+                "支持以下命令：\n"
+                f"1. 生成图片：{' 或 '.join(self.commands)} [描述]\n"
+                f"2. 编辑图片：{' 或 '.join(self.edit_commands)} [描述]\n"
+                f"3. 结束对话：{' 或 '.join(self.exit_commands)}\n\n"
+            )
+            self._help_text_verbose = (
+                self._help_text_brief
+                + "使用说明：\n"
+                "- 生成图片后会开始一个会话，可以通过发送命令继续修改图片\n"
+                "- 每个会话的有效期为10分钟，超时需要重新开始\n"
+                "- 发送结束对话命令可以立即结束当前会话\n"
+            )
+
             # 获取图片保存配置
             self.save_path = self.config.get("save_path", "temp")
             self.save_dir = os.path.join(os.path.dirname(__file__), self.save_path)
             os.makedirs(self.save_dir, exist_ok=True)
+            # 目录在初始化时已创建，热路径上直接拼前缀，避免逐次os.path.join
+            self._path_prefix = self.save_dir + os.sep
             
-            # 获取代理配置
+            # 获取代理配置；请求用的代理结构只依赖初始化配置，一次构建
             self.enable_proxy = self.config.get("enable_proxy", False)
             self.proxy_url = self.config.get("proxy_url", "")
+            self._proxy = self.proxy_url if self.enable_proxy and self.proxy_url else None
+            self._proxies = {"http": self.proxy_url, "https": self.proxy_url} if self._proxy else None
             
             # 获取baseurl配置
             self.base_url = self.config.get("base_url", "https://generativelanguage.googleapis.com")
-            
+
+            # 请求中不随调用变化的部分只构建一次
+            self._gen_url = f"{self.base_url}/v1beta/models/gemini-2.0-flash-exp-image-generation:generateContent"
+            self._base_headers = {"Content-Type": "application/json"}
+            self._api_params = {"key": self.api_key}
+            self._generation_config = {"response_modalities": ["Text", "Image"]}
+            if self.candidate_count > 1:
+                self._generation_config["candidateCount"] = self.candidate_count
+            # 编辑路径始终单图返回，不带candidateCount
+            self._edit_generation_config = {"response_modalities": ["Text", "Image"]}
+            # 无历史生图请求除提示词外全为常量，预序列化成bytes模板，
+            # 调用时仅需对提示词做一次JSON转义
+            self._nohist_body_tmpl = (
+                b'{"contents":[{"parts":[{"text":%b}]}],"generation_config":'
+                + _json_dumps(self._generation_config) + b"}"
+            )
+
+            # aiohttp会话，首次请求时在事件循环线程中创建
+            self._aiohttp_session = None
+
+            # requests会话（aiohttp不可用时的回退路径），连接池+keep-alive复用TLS连接，
+            # 对网关类错误自动重试
+            self.http = requests.Session()
+            self.http.headers.update(self._base_headers)
+            self.http.mount("https://", HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=16,
+                max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+            ))
+
+            # 后台IO线程池，图片落盘等非关键路径工作不阻塞消息处理线程
+            self._io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="GeminiImageIO")
+
             # 初始化会话状态，用于保存上下文
-            self.conversations = defaultdict(list)  # 用户ID -> 对话历史列表
+            # deque(maxlen=10)保留最近5轮对话，追加时自动淘汰旧消息
+            self.conversations = defaultdict(lambda: deque(maxlen=10))  # 用户ID -> 对话历史队列
             self.conversation_expiry = 600  # 会话过期时间(秒)
             self.conversation_timestamps = {}  # 用户ID -> 最后活动时间
             
             # 存储最后一次生成的图片路径
             self.last_images = {}  # 会话标识 -> 最后一次生成的图片路径
             
-            # 全局图片缓存，用于存储最近接收到的图片
-            self.image_cache = {}  # 会话标识 -> {content: bytes, timestamp: float}
+            # 全局图片缓存，用于存储最近接收到的图片，LRU淘汰
+            self.image_cache = OrderedDict()  # 缓存键 -> {content, timestamp, index_keys}
             self.image_cache_timeout = 300  # 图片缓存过期时间(秒)
+            self.image_cache_capacity = 64  # 缓存条目上限
+            # 倒排索引：群ID/发送者ID -> 含该成分的缓存键集合，查找无需全表扫描
+            self._image_cache_index = defaultdict(set)
+            # 负缓存：短时间内重复未命中的会话键直接返回None，跳过多级扫描
+            self._neg_cache = {}  # 会话键 -> 未命中时间戳
+            self._neg_cache_ttl = 2.0
+
+            # 过期扫描节流：会话/图片缓存在访问时惰性过期，全量扫描只做周期性兜底
+            self._expiry_sweep_interval = 60  # 全量扫描的最小间隔(秒)
+            self._next_expiry_sweep = 0
+
+            # base64编码结果的小容量缓存，同一图片在多次编辑/重试间不重复编码
+            self._b64_cache = {}  # bytes -> str
+            self._b64_cache_size = 8
+
+            # 历史图片base64的LRU缓存，键为(路径, mtime)，多轮对话不重复读盘编码
+            self._history_b64_cache = OrderedDict()
+            self._history_b64_cache_size = 64
+
+            # 复用BytesIO缓冲，突发多图时减少多MB级的反复分配
+            self._buf_pool = queue.LifoQueue(maxsize=8)
             
             # 验证关键配置
             if not self.api_key:
@@ -122,39 +328,139 @@ class GeminiImage(Plugin):
             logger.exception(e)
             self.enable = False
     
+    @staticmethod
+    def _compile_command_re(commands):
+        """把命令列表编译成单个前缀匹配正则，按长度降序保证最长命令优先"""
+        alternation = "|".join(re.escape(cmd) for cmd in sorted(commands, key=len, reverse=True))
+        return re.compile("^(" + alternation + ")(.*)$", re.S)
+
     def _start_cleanup_thread(self):
-        """启动一个后台线程用于定期清理"""
-        import threading
-        
-        # 定义清理函数
-        def cleanup_worker():
-            while True:
+        """调度夜间临时文件清理，是临时文件清理的唯一入口"""
+        self._schedule_next_cleanup()
+        logger.info("临时文件清理定时器已启动")
+
+    @staticmethod
+    def _seconds_until_next_cleanup() -> float:
+        """计算距离下一个凌晨2点清理窗口的秒数"""
+        now = datetime.now()
+        target = now.replace(hour=2, minute=0, second=0, microsecond=0)
+        if now >= target:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+
+    def _schedule_next_cleanup(self):
+        """安排下一次夜间清理，单个Timer替代每小时轮询的常驻线程"""
+        timer = threading.Timer(self._seconds_until_next_cleanup(), self._run_scheduled_cleanup)
+        timer.daemon = True
+        timer.start()
+        self._cleanup_timer = timer
+
+    def _run_scheduled_cleanup(self):
+        try:
+            logger.info("执行定期清理临时文件")
+            self._cleanup_temp_files()
+            self._last_cleanup_time = time.time()
+        # 异常处理，确保下一次清理仍会被调度
+        except Exception as e:
+            logger.error(f"清理任务发生错误: {str(e)}")
+        finally:
+            self._schedule_next_cleanup()
+
+    @classmethod
+    def _get_async_loop(cls):
+        """获取共享的asyncio事件循环，首次调用时在守护线程中启动"""
+        with cls._async_loop_lock:
+            if cls._async_loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="GeminiImageLoop", daemon=True)
+                thread.start()
+                cls._async_loop = loop
+        return cls._async_loop
+
+    async def _post_async(self, url, params, body, sniff_image_safety=False):
+        """在事件循环中发送POST请求，并发的生图请求在网络等待上互相重叠"""
+        if self._aiohttp_session is None:
+            connector = aiohttp.TCPConnector(limit=32, keepalive_timeout=75)
+            self._aiohttp_session = aiohttp.ClientSession(connector=connector)
+        timeout = aiohttp.ClientTimeout(total=120)  # 120秒超时，解决多图文任务超时问题
+        async with self._aiohttp_session.post(url, params=params, data=body, headers=self._base_headers, proxy=self._proxy, timeout=timeout) as response:
+            raw = await response.read()
+            if response.status != 200:
+                return response.status, None, raw.decode("utf-8", "replace")
+            # 安全拦截的响应体直接按字节串探测，整个多MB响应不进JSON解析
+            if sniff_image_safety and b'"IMAGE_SAFETY"' in raw:
+                return response.status, None, raw.decode("utf-8", "replace")
+            return response.status, _json_loads(raw), None
+
+    def _call_gemini_api(self, payload, sniff_image_safety=False):
+        """调用Gemini generateContent接口
+
+        优先通过aiohttp在共享事件循环中发送，阻塞的只有当前工作线程；
+        未安装aiohttp时退回同步requests。sniff_image_safety开启时，
+        200响应先做字节级IMAGE_SAFETY探测，命中则不解析JSON直接返回原文。
+
+        Returns:
+            Tuple[int, Optional[dict], Optional[str]]: 状态码、响应JSON（成功时）、错误文本（失败或安全拦截时）
+        """
+        # 允许调用方传入已序列化的bytes请求体（如无历史模板），跳过重复序列化
+        body = payload if isinstance(payload, bytes) else _json_dumps(payload)
+        if aiohttp is not None:
+            loop = self._get_async_loop()
+            future = asyncio.run_coroutine_threadsafe(self._post_async(self._gen_url, self._api_params, body, sniff_image_safety), loop)
+            return future.result()
+
+        # 未安装aiohttp，使用requests同步请求
+        response = self.http.post(self._gen_url, params=self._api_params, data=body, proxies=self._proxies, timeout=120)
+        if response.status_code != 200:
+            return response.status_code, None, response.text
+        raw = response.content
+        if sniff_image_safety and b'"IMAGE_SAFETY"' in raw:
+            return response.status_code, None, raw.decode("utf-8", "replace")
+        return response.status_code, _json_loads(raw), None
+
+    def _acquire_buffer(self, data: bytes) -> BytesIO:
+        """从池中取出一个BytesIO并填入数据，池空时新建"""
+        try:
+            buf = self._buf_pool.get_nowait()
+            buf.seek(0)
+            buf.truncate()
+        except queue.Empty:
+            buf = BytesIO()
+        buf.write(data)
+        buf.seek(0)
+        return buf
+
+    def _release_buffer(self, buf: BytesIO):
+        """把BytesIO放回池中复用；仅用于所有权未移交出去的缓冲"""
+        try:
+            self._buf_pool.put_nowait(buf)
+        except queue.Full:
+            pass
+
+    def _encode_image_base64(self, image_data: bytes) -> str:
+        """base64编码图片数据，带小容量缓存，同一图片重复编码时直接命中"""
+        encoded = self._b64_cache.get(image_data)
+        if encoded is None:
+            encoded = _b64encode_ascii(image_data)
+            if len(self._b64_cache) >= self._b64_cache_size:
+                # 淘汰最早放入的条目
+                self._b64_cache.pop(next(iter(self._b64_cache)))
+            self._b64_cache[image_data] = encoded
+        return encoded
+
+    def _save_image_async(self, image_path: str, image_data: bytes):
+        """把图片写盘任务提交到后台IO线程池，不阻塞当前消息处理线程"""
+        def _write():
+            try:
+                # 绕过Python缓冲IO层，整块数据一次write写入
+                fd = os.open(image_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
                 try:
-                    # 获取当前时间
-                    current_time = time.time()
-                    current_hour = time.localtime(current_time).tm_hour
-                    
-                    # 晚上2点到4点之间执行清理
-                    is_night_time = 2 <= current_hour <= 4
-                    time_since_last_cleanup = current_time - self._last_cleanup_time
-                    
-                    # 如果是夜间或者距离上次清理已经超过24小时，执行清理
-                    if is_night_time or time_since_last_cleanup > 24 * 3600:
-                        logger.info("执行定期清理临时文件")
-                        self._cleanup_temp_files()
-                        self._last_cleanup_time = current_time
-                
-                # 异常处理，确保线程不会因为错误而终止
-                except Exception as e:
-                    logger.error(f"清理线程发生错误: {str(e)}")
-                
-                # 每小时检查一次
-                time.sleep(3600)
-        
-        # 创建并启动后台线程
-        cleanup_thread = threading.Thread(target=cleanup_worker, daemon=True)
-        cleanup_thread.start()
-        logger.info("临时文件清理线程已启动")
+                    os.write(fd, image_data)
+                finally:
+                    os.close(fd)
+            except Exception as e:
+                logger.error(f"后台保存图片失败 {image_path}: {str(e)}")
+        self._io_pool.submit(_write)
 
     def on_handle_context(self, e_context: EventContext):
         """处理消息事件"""
@@ -163,30 +469,6 @@ class GeminiImage(Plugin):
         
         context = e_context['context']
         
-        # 清理过期的会话和图片缓存
-        self._cleanup_expired_conversations()
-        self._cleanup_image_cache()
-        
-        # 基于时间的临时文件清理
-        current_time = time.time()
-        if not hasattr(self, '_last_cleanup_time'):
-            self._last_cleanup_time = current_time
-            
-        # 检查是否是深夜时段（凌晨2-4点之间）
-        current_hour = time.localtime(current_time).tm_hour
-        is_night_time = 2 <= current_hour <= 4
-        
-        # 如果是深夜时段，且距离上次清理已超过6小时，执行清理
-        if is_night_time and (current_time - self._last_cleanup_time) > 6 * 3600:
-            logger.info("执行夜间定时清理临时文件")
-            self._cleanup_temp_files()
-            self._last_cleanup_time = current_time
-        
-        # 会话标识: 用户ID+会话ID
-        user_id = context["session_id"]
-        conversation_key = user_id
-        is_group = context.get("isgroup", False)
-        
         # 处理图片消息 - 用于缓存用户发送的图片
         if context.type == ContextType.IMAGE:
             self._handle_image_message(e_context)
@@ -197,9 +479,27 @@ class GeminiImage(Plugin):
             return
         
         content = context.content.strip()
+
+        # 会话标识: 用户ID+会话ID
+        user_id = context["session_id"]
+        conversation_key = user_id
+        is_group = context.get("isgroup", False)
+
+        # 非命令消息直接放行：首字符不是任何命令前缀且无auto_edit会话时，
+        # 这里就是绝大多数消息在本插件内的全部开销
+        if not content or (content[0] not in self._cmd_first_chars and not (self.auto_edit and conversation_key in self.conversations)):
+            return
+
+        # 周期性兜底清理过期的会话和图片缓存，正常访问走惰性过期
+        # TTL一律用monotonic时钟，NTP校时不会造成误过期
+        now = time.monotonic()
+        if now >= self._next_expiry_sweep:
+            self._next_expiry_sweep = now + self._expiry_sweep_interval
+            self._cleanup_expired_conversations()
+            self._cleanup_image_cache()
         
         # 检查是否是结束对话命令
-        if content in self.exit_commands:
+        if content in self._exit_command_set:
             try:
                 if conversation_key in self.conversations:
                     # 清除会话数据
@@ -227,326 +527,316 @@ class GeminiImage(Plugin):
             return
 
         # 检查是否是生成图片命令
-        for cmd in self.commands:
-            if content.startswith(cmd):
-                # 提取提示词
-                prompt = content[len(cmd):].strip()
-                if not prompt:
-                    reply = Reply(ReplyType.TEXT, f"请提供描述内容，格式：{cmd} [描述]")
-                    e_context["channel"].send(reply, e_context["context"])
-                    e_context.action = EventAction.BREAK_PASS
-                    return
+        match = self._generate_cmd_re.match(content)
+        if match:
+            cmd = match.group(1)
+            # 提取提示词
+            prompt = match.group(2).strip()
+            if not prompt:
+                reply = Reply(ReplyType.TEXT, f"请提供描述内容，格式：{cmd} [描述]")
+                e_context["channel"].send(reply, e_context["context"])
+                e_context.action = EventAction.BREAK_PASS
+                return
                 
-                # 检查API密钥是否配置
-                if not self.api_key:
-                    reply = Reply(ReplyType.TEXT, "请先在配置文件中设置Gemini API密钥")
-                    e_context["channel"].send(reply, e_context["context"])
-                    e_context.action = EventAction.BREAK_PASS
-                    return
+            # 检查API密钥是否配置
+            if not self.api_key:
+                reply = Reply(ReplyType.TEXT, "请先在配置文件中设置Gemini API密钥")
+                e_context["channel"].send(reply, e_context["context"])
+                e_context.action = EventAction.BREAK_PASS
+                return
                 
-                # 在处理命令时设置标记，确保无论是否出现异常都会拦截命令
-                try:
-                    # 发送处理中消息
-                    processing_reply = Reply(ReplyType.TEXT, "正在生成图片，请稍候...")
-                    e_context["channel"].send(processing_reply, e_context["context"])
+            # 在处理命令时设置标记，确保无论是否出现异常都会拦截命令
+            try:
+                # 发送处理中消息
+                processing_reply = Reply(ReplyType.TEXT, "正在生成图片，请稍候...")
+                self._io_pool.submit(e_context["channel"].send, processing_reply, e_context["context"])
                     
-                    # 获取上下文历史
-                    conversation_history = self.conversations[conversation_key]
+                # 获取上下文历史
+                conversation_history = self._get_conversation(conversation_key)
                     
-                    # 生成图片
-                    image_datas, text_responses = self._generate_image(prompt, conversation_history)
+                # 生成图片
+                image_datas, text_responses = self._generate_image(prompt, conversation_history)
                     
-                    if image_datas:
-                        # 在生成图片之前确保clean_texts有效
-                        if text_responses and any(text is not None for text in text_responses):
-                            # 过滤掉None值
-                            valid_responses = [text for text in text_responses if text]
-                            if valid_responses:
-                                clean_texts = [text.replace("/", "_").replace("\\", "_").replace(":", "_").replace("*", "_") for text in valid_responses]
-                                clean_texts = [text[:30] + "..." if len(text) > 30 else text for text in clean_texts]
-                            else:
-                                clean_texts = ["generated_image"]  # 默认名称
+                if image_datas:
+                    # 在生成图片之前确保clean_texts有效
+                    if text_responses and any(text is not None for text in text_responses):
+                        # 过滤掉None值
+                        valid_responses = [text for text in text_responses if text]
+                        if valid_responses:
+                            clean_texts = [text.translate(self._SAFE_FN_TABLE) for text in valid_responses]
+                            clean_texts = [text[:30] + "..." if len(text) > 30 else text for text in clean_texts]
                         else:
                             clean_texts = ["generated_image"]  # 默认名称
+                    else:
+                        clean_texts = ["generated_image"]  # 默认名称
                         
-                        # 保存图片到本地
-                        image_paths = []
-                        for i, image_data in enumerate(image_datas):
-                            if image_data is not None:  # 确保图片数据不为None
-                                # 确保有足够的clean_text
-                                clean_text = clean_texts[i] if i < len(clean_texts) else f"image_{i}"
-                                image_path = os.path.join(self.save_dir, f"gemini_{int(time.time())}_{uuid.uuid4().hex[:8]}_{clean_text}.png")
-                                with open(image_path, "wb") as f:
-                                    f.write(image_data)
-                                image_paths.append(image_path)
+                    # 保存图片到本地
+                    image_paths = []
+                    saved_image_datas = []  # 与image_paths对齐的原始字节，留在历史里避免回读
+                    now_ts = int(time.time())
+                    for i, image_data in enumerate(image_datas):
+                        if image_data is not None:  # 确保图片数据不为None
+                            # 确保有足够的clean_text
+                            clean_text = clean_texts[i] if i < len(clean_texts) else f"image_{i}"
+                            image_path = f"{self._path_prefix}gemini_{now_ts}_{uuid.uuid4().hex[:8]}_{clean_text}.png"
+                            self._save_image_async(image_path, image_data)
+                            image_paths.append(image_path)
+                            saved_image_datas.append(image_data)
                         
-                        # 只有在成功保存了图片时才更新和处理会话
-                        if image_paths:
-                            # 保存最后生成的图片路径
-                            if len(image_paths) > 0:
-                                self.last_images[conversation_key] = image_paths
-                                logger.info(f"保存最后生成的图片路径: {image_paths}")
-                            else:
-                                # 如果没有图片（此处逻辑上不会执行，但保留以防万一）
-                                self.last_images[conversation_key] = None
+                    # 只有在成功保存了图片时才更新和处理会话
+                    if image_paths:
+                        # 保存最后生成的图片路径
+                        if len(image_paths) > 0:
+                            self.last_images[conversation_key] = image_paths
+                            logger.info(f"保存最后生成的图片路径: {image_paths}")
+                        else:
+                            # 如果没有图片（此处逻辑上不会执行，但保留以防万一）
+                            self.last_images[conversation_key] = None
                             
-                            # 添加用户提示到会话
-                            user_messages = [{"role": "user", "parts": [{"text": prompt}]} for prompt in prompt.split()]
-                            conversation_history.extend(user_messages)
+                        # 添加用户提示到会话
+                        conversation_history.append({"role": "user", "parts": [{"text": prompt}]})
                             
-                            # 添加助手回复到会话
-                            assistant_messages = []
-                            for i in range(len(image_paths)):
-                                text = None
-                                if i < len(text_responses):
-                                    text = text_responses[i]
+                        # 添加助手回复到会话
+                        assistant_messages = []
+                        for i in range(len(image_paths)):
+                            text = None
+                            if i < len(text_responses):
+                                text = text_responses[i]
                                 
-                                assistant_messages.append({
-                                    "role": "model", 
-                                    "parts": [
-                                        {"text": text if text else "我已生成了图片"},
-                                        {"image_url": image_paths[i]}
-                                    ]
-                                })
-                            conversation_history.extend(assistant_messages)
+                            assistant_messages.append({
+                                "role": "model", 
+                                "parts": [
+                                    {"text": text if text else "我已生成了图片"},
+                                    {"image_url": image_paths[i], "_bytes": saved_image_datas[i]}
+                                ]
+                            })
+                        conversation_history.extend(assistant_messages)
                             
-                            # 限制会话历史长度
-                            if len(conversation_history) > 10:  # 保留最近5轮对话
-                                conversation_history = conversation_history[-10:]
-                            
-                            # 更新会话时间戳
-                            self.conversation_timestamps[conversation_key] = time.time()
+                        # 更新会话时间戳
+                        self.conversation_timestamps[conversation_key] = time.monotonic()
                             
-                            # 先发送文本消息
-                            has_sent_text = False
+                        # 先发送文本消息
+                        has_sent_text = False
                             
-                            # 确定要遍历的最大长度，取图片和文本列表中的最大长度
-                            max_length = max(len(image_datas), len(text_responses))
+                        # 确定要遍历的最大长度，取图片和文本列表中的最大长度
+                        max_length = max(len(image_datas), len(text_responses))
                             
-                            for i in range(max_length):
-                                # 获取当前索引的图片和文本（如果存在）
-                                img_data = image_datas[i] if i < len(image_datas) else None
-                                text = text_responses[i] if i < len(text_responses) else None
+                        for i in range(max_length):
+                            # 获取当前索引的图片和文本（如果存在）
+                            img_data = image_datas[i] if i < len(image_datas) else None
+                            text = text_responses[i] if i < len(text_responses) else None
                                 
-                                if text:  # 如果有文本，先发送文本
-                                    e_context["channel"].send(Reply(ReplyType.TEXT, text), e_context["context"])
-                                    has_sent_text = True  # 标记已发送文本
+                            if text:  # 如果有文本，先发送文本
+                                e_context["channel"].send(Reply(ReplyType.TEXT, text), e_context["context"])
+                                has_sent_text = True  # 标记已发送文本
                                 
-                                if img_data:  # 如果有图片，再发送图片
-                                    # 创建临时文件保存图片，每个图片都需要单独发送
-                                    temp_image_path = os.path.join(self.save_dir, f"temp_{int(time.time())}_{uuid.uuid4().hex[:8]}_{i}.png")
-                                    with open(temp_image_path, "wb") as f:
-                                        f.write(img_data)
-                                    
-                                    # 单独发送每张图片
-                                    image_file = open(temp_image_path, "rb")
-                                    e_context["channel"].send(Reply(ReplyType.IMAGE, image_file), e_context["context"])
+                            if img_data:  # 如果有图片，再发送图片
+                                # 直接从内存发送，避免写盘后再读回的冗余IO
+                                image_buf = BytesIO(img_data)
+                                image_buf.name = f"gemini_image_{i}.png"
+                                e_context["channel"].send(Reply(ReplyType.IMAGE, image_buf), e_context["context"])
                             
-                            # 如果已经发送了文本，则不再重复发送
-                            if not has_sent_text:
-                                # 只有在没有发送过文本的情况下，才发送汇总文本
-                                if any(text is not None for text in text_responses):
+                        # 如果已经发送了文本，则不再重复发送
+                        if not has_sent_text:
+                            # 只有在没有发送过文本的情况下，才发送汇总文本
+                            if any(text is not None for text in text_responses):
+                                valid_responses = [text for text in text_responses if text]
+                                if valid_responses:
+                                    translated_responses = [self._translate_gemini_message(text) for text in valid_responses]
+                                    reply_text = "\n".join([resp for resp in translated_responses if resp])
+                                    e_context["channel"].send(Reply(ReplyType.TEXT, reply_text), e_context["context"])
+                            else:
+                                # 检查是否有文本响应，可能是内容被拒绝
+                                if text_responses and any(text is not None for text in text_responses):
+                                    # 过滤掉None值
                                     valid_responses = [text for text in text_responses if text]
                                     if valid_responses:
+                                        # 内容审核拒绝的情况，翻译并发送拒绝消息
                                         translated_responses = [self._translate_gemini_message(text) for text in valid_responses]
                                         reply_text = "\n".join([resp for resp in translated_responses if resp])
                                         e_context["channel"].send(Reply(ReplyType.TEXT, reply_text), e_context["context"])
-                                else:
-                                    # 检查是否有文本响应，可能是内容被拒绝
-                                    if text_responses and any(text is not None for text in text_responses):
-                                        # 过滤掉None值
-                                        valid_responses = [text for text in text_responses if text]
-                                        if valid_responses:
-                                            # 内容审核拒绝的情况，翻译并发送拒绝消息
-                                            translated_responses = [self._translate_gemini_message(text) for text in valid_responses]
-                                            reply_text = "\n".join([resp for resp in translated_responses if resp])
-                                            e_context["channel"].send(Reply(ReplyType.TEXT, reply_text), e_context["context"])
-                                        else:
-                                            e_context["channel"].send(Reply(ReplyType.TEXT, "图片生成失败，请稍后再试或修改提示词"), e_context["context"])
-                    else:
-                        # 检查是否有文本响应，可能是内容被拒绝
-                        if text_responses and any(text is not None for text in text_responses):
-                            # 过滤掉None值
-                            valid_responses = [text for text in text_responses if text]
-                            if valid_responses:
-                                # 内容审核拒绝的情况，翻译并发送拒绝消息
-                                translated_responses = [self._translate_gemini_message(text) for text in valid_responses]
-                                reply_text = "\n".join([resp for resp in translated_responses if resp])
-                                e_context["channel"].send(Reply(ReplyType.TEXT, reply_text), e_context["context"])
-                            else:
-                                e_context["channel"].send(Reply(ReplyType.TEXT, "图片生成失败，请稍后再试或修改提示词"), e_context["context"])
+                                    else:
+                                        e_context["channel"].send(Reply(ReplyType.TEXT, "图片生成失败，请稍后再试或修改提示词"), e_context["context"])
+                else:
+                    # 检查是否有文本响应，可能是内容被拒绝
+                    if text_responses and any(text is not None for text in text_responses):
+                        # 过滤掉None值
+                        valid_responses = [text for text in text_responses if text]
+                        if valid_responses:
+                            # 内容审核拒绝的情况，翻译并发送拒绝消息
+                            translated_responses = [self._translate_gemini_message(text) for text in valid_responses]
+                            reply_text = "\n".join([resp for resp in translated_responses if resp])
+                            e_context["channel"].send(Reply(ReplyType.TEXT, reply_text), e_context["context"])
                         else:
-                            # 如果没有任何响应，发送默认失败消息
                             e_context["channel"].send(Reply(ReplyType.TEXT, "图片生成失败，请稍后再试或修改提示词"), e_context["context"])
-                except Exception as e:
-                    logger.error(f"生成图片失败: {str(e)}")
-                    logger.exception(e)
-                    reply_text = f"生成图片失败: {str(e)}"
-                    e_context["channel"].send(Reply(ReplyType.TEXT, reply_text), e_context["context"])
-                finally:
-                    # 确保在任何情况下都设置action为BREAK_PASS
-                    e_context.action = EventAction.BREAK_PASS
-                    logger.info("图片生成命令已处理，设置action为BREAK_PASS")
-                return
+                    else:
+                        # 如果没有任何响应，发送默认失败消息
+                        e_context["channel"].send(Reply(ReplyType.TEXT, "图片生成失败，请稍后再试或修改提示词"), e_context["context"])
+            except Exception as e:
+                logger.error("生成图片失败: %s", e)
+                logger.debug("异常堆栈", exc_info=True)
+                reply_text = f"生成图片失败: {str(e)}"
+                e_context["channel"].send(Reply(ReplyType.TEXT, reply_text), e_context["context"])
+            finally:
+                # 确保在任何情况下都设置action为BREAK_PASS
+                e_context.action = EventAction.BREAK_PASS
+                logger.info("图片生成命令已处理，设置action为BREAK_PASS")
+            return
 
         # 检查是否是编辑图片命令
-        for cmd in self.edit_commands:
-            if content.startswith(cmd):
-                # 提取提示词
-                prompt = content[len(cmd):].strip()
-                if not prompt:
-                    reply = Reply(ReplyType.TEXT, f"请提供编辑描述，格式：{cmd} [描述]")
-                    e_context["channel"].send(reply, e_context["context"])
-                    e_context.action = EventAction.BREAK_PASS
-                    return
+        match = self._edit_cmd_re.match(content)
+        if match:
+            cmd = match.group(1)
+            # 提取提示词
+            prompt = match.group(2).strip()
+            if not prompt:
+                reply = Reply(ReplyType.TEXT, f"请提供编辑描述，格式：{cmd} [描述]")
+                e_context["channel"].send(reply, e_context["context"])
+                e_context.action = EventAction.BREAK_PASS
+                return
                 
-                # 检查API密钥是否配置
-                if not self.api_key:
-                    reply = Reply(ReplyType.TEXT, "请先在配置文件中设置Gemini API密钥")
-                    e_context["channel"].send(reply, e_context["context"])
-                    e_context.action = EventAction.BREAK_PASS
-                    return
+            # 检查API密钥是否配置
+            if not self.api_key:
+                reply = Reply(ReplyType.TEXT, "请先在配置文件中设置Gemini API密钥")
+                e_context["channel"].send(reply, e_context["context"])
+                e_context.action = EventAction.BREAK_PASS
+                return
                 
-                # 添加try/finally确保命令被拦截
-                try:
-                    # 先尝试从缓存获取最近的图片
-                    image_data = self._get_recent_image(conversation_key)
-                    image_path = None
+            # 添加try/finally确保命令被拦截
+            try:
+                # 先尝试从缓存获取最近的图片
+                image_data = self._get_recent_image(conversation_key)
+                image_path = None
                     
-                    if image_data:
-                        # 如果找到缓存的图片，保存到本地
-                        image_path = os.path.join(self.save_dir, f"temp_{int(time.time())}_{uuid.uuid4().hex[:8]}.png")
-                        with open(image_path, "wb") as f:
-                            f.write(image_data)
-                        
-                        # 更新最后保存的图片路径
-                        self.last_images[conversation_key] = image_path
-                        logger.info(f"从缓存中找到图片数据，大小: {len(image_data)} 字节，保存到: {image_path}")
+                if image_data:
+                    # 如果找到缓存的图片，后台保存到本地
+                    image_path = f"{self._path_prefix}temp_{int(time.time())}_{uuid.uuid4().hex[:8]}.png"
+                    self._save_image_async(image_path, image_data)
+
+                    # 更新最后保存的图片路径
+                    self.last_images[conversation_key] = image_path
+                    logger.info(f"从缓存中找到图片数据，大小: {len(image_data)} 字节，保存到: {image_path}")
                     
-                    # 如果从缓存找不到图片，检查最后保存的图片
-                    if not image_data:
-                        last_image_path = self.last_images.get(conversation_key)
+                # 如果从缓存找不到图片，检查最后保存的图片
+                if not image_data:
+                    last_image_path = self.last_images.get(conversation_key)
                         
-                        # 如果last_image_path是列表，取第一个有效路径
-                        if isinstance(last_image_path, list) and last_image_path:
-                            # 找到第一个存在的图片路径
-                            valid_path = None
-                            for path in last_image_path:
-                                if os.path.exists(path):
-                                    valid_path = path
-                                    break
-                            last_image_path = valid_path
-                            logger.info(f"从last_images列表中找到有效路径: {valid_path}")
+                    # 如果last_image_path是列表，取第一个有效路径
+                    if isinstance(last_image_path, list) and last_image_path:
+                        # 找到第一个存在的图片路径
+                        valid_path = None
+                        for path in last_image_path:
+                            if os.path.exists(path):
+                                valid_path = path
+                                break
+                        last_image_path = valid_path
+                        logger.info(f"从last_images列表中找到有效路径: {valid_path}")
                         
-                        if last_image_path and os.path.exists(last_image_path):
-                            # 读取最后保存的图片
-                            with open(last_image_path, "rb") as f:
-                                image_data = f.read()
-                            image_path = last_image_path
-                            logger.info(f"从最后保存的图片路径读取图片数据: {last_image_path}")
-                        else:
-                            # 没有可用的图片
-                            reply = Reply(ReplyType.TEXT, "未找到可编辑的图片，请先上传一张图片或使用生成图片命令")
-                            e_context["channel"].send(reply, e_context["context"])
-                        e_context.action = EventAction.BREAK_PASS
-                        return
+                    if last_image_path and os.path.exists(last_image_path):
+                        # 读取最后保存的图片
+                        with open(last_image_path, "rb", buffering=1 << 20) as f:
+                            image_data = f.read()
+                        image_path = last_image_path
+                        logger.info(f"从最后保存的图片路径读取图片数据: {last_image_path}")
+                    else:
+                        # 没有可用的图片
+                        reply = Reply(ReplyType.TEXT, "未找到可编辑的图片，请先上传一张图片或使用生成图片命令")
+                        e_context["channel"].send(reply, e_context["context"])
+                    e_context.action = EventAction.BREAK_PASS
+                    return
                     
-                    # 已获取到图片数据，开始编辑
-                    # 发送处理中消息
-                    processing_reply = Reply(ReplyType.TEXT, "正在编辑图片，请稍候...")
-                    e_context["channel"].send(processing_reply, e_context["context"])
+                # 已获取到图片数据，开始编辑
+                # 发送处理中消息
+                processing_reply = Reply(ReplyType.TEXT, "正在编辑图片，请稍候...")
+                self._io_pool.submit(e_context["channel"].send, processing_reply, e_context["context"])
                     
-                    # 获取会话上下文
-                    conversation_history = self.conversations[conversation_key]
+                # 获取会话上下文
+                conversation_history = self._get_conversation(conversation_key)
                     
-                    # 编辑图片
-                    result_image, text_response = self._edit_image(prompt, image_data, conversation_history)
+                # 编辑图片
+                result_image, text_response = self._edit_image(prompt, image_data, conversation_history)
                     
-                    if result_image:
-                        # 保存编辑后的图片
-                        reply_text = text_response if text_response else "图片编辑成功！"
+                if result_image:
+                    # 保存编辑后的图片
+                    reply_text = text_response if text_response else "图片编辑成功！"
                         
-                        if not conversation_history or len(conversation_history) <= 2:  # 如果是新会话
-                            reply_text += f"（已开始图像对话，可以继续发送命令修改图片。需要结束时请发送\"{self.exit_commands[0]}\"）"
+                    if not conversation_history or len(conversation_history) <= 2:  # 如果是新会话
+                        reply_text += f"（已开始图像对话，可以继续发送命令修改图片。需要结束时请发送\"{self.exit_commands[0]}\"）"
                             
-                        # 将回复文本添加到文件名中
-                        clean_text = reply_text.replace("/", "_").replace("\\", "_").replace(":", "_").replace("*", "_")
-                        clean_text = clean_text[:30] + "..." if len(clean_text) > 30 else clean_text
+                    # 将回复文本添加到文件名中
+                    clean_text = reply_text.translate(self._SAFE_FN_TABLE)
+                    clean_text = clean_text[:30] + "..." if len(clean_text) > 30 else clean_text
                         
-                        edited_image_path = os.path.join(self.save_dir, f"edited_{int(time.time())}_{uuid.uuid4().hex[:8]}_{clean_text}.png")
-                        with open(edited_image_path, "wb") as f:
-                            f.write(result_image)
-                        
-                        # 更新最后生成的图片路径 - 对于编辑功能，保持单个路径更简单
-                        self.last_images[conversation_key] = edited_image_path
-                        logger.info(f"更新最后编辑的图片路径: {edited_image_path}")
-                        
-                        # 更新会话历史
-                        user_message = {
-                            "role": "user", 
-                            "parts": [
-                                {"text": prompt},
-                                {"image_url": image_path}
-                            ]
-                        }
-                        conversation_history.append(user_message)
+                    edited_image_path = f"{self._path_prefix}edited_{int(time.time())}_{uuid.uuid4().hex[:8]}_{clean_text}.png"
+                    self._save_image_async(edited_image_path, result_image)
+
+                    # 更新最后生成的图片路径 - 对于编辑功能，保持单个路径更简单
+                    self.last_images[conversation_key] = edited_image_path
+                    logger.info(f"更新最后编辑的图片路径: {edited_image_path}")
                         
-                        # 会话历史部分
-                        assistant_message = {
-                            "role": "model", 
-                            "parts": [
-                                {"text": text_response if text_response else "我已编辑了图片"},
-                                {"image_url": edited_image_path}
-                            ]
-                        }
-                        conversation_history.append(assistant_message)
+                    # 更新会话历史
+                    user_message = {
+                        "role": "user", 
+                        "parts": [
+                            {"text": prompt},
+                            {"image_url": image_path, "_bytes": image_data}
+                        ]
+                    }
+                    conversation_history.append(user_message)
                         
-                        # 限制会话历史长度
-                        if len(conversation_history) > 10:  # 保留最近5轮对话
-                            conversation_history = conversation_history[-10:]
+                    # 会话历史部分
+                    assistant_message = {
+                        "role": "model", 
+                        "parts": [
+                            {"text": text_response if text_response else "我已编辑了图片"},
+                            {"image_url": edited_image_path, "_bytes": result_image}
+                        ]
+                    }
+                    conversation_history.append(assistant_message)
                         
-                        # 更新会话时间戳
-                        self.conversation_timestamps[conversation_key] = time.time()
+                    # 更新会话时间戳
+                    self.conversation_timestamps[conversation_key] = time.monotonic()
                         
-                        # 先发送文本消息
-                        cleaned_reply_text = reply_text.strip()
-                        e_context["channel"].send(Reply(ReplyType.TEXT, cleaned_reply_text), e_context["context"])
+                    # 先发送文本消息
+                    cleaned_reply_text = reply_text.strip()
+                    e_context["channel"].send(Reply(ReplyType.TEXT, cleaned_reply_text), e_context["context"])
                         
-                        # 再发送图片
-                        edited_image_file = open(edited_image_path, "rb")
-                        e_context["channel"].send(Reply(ReplyType.IMAGE, edited_image_file), e_context["context"])
-                        e_context.action = EventAction.BREAK_PASS
-                    else:
-                        # 检查是否有文本响应，可能是内容被拒绝
-                        if text_response:
-                            # 确保translated_response是字符串
-                            if isinstance(text_response, list):
-                                valid_texts = [t for t in text_response if t]
-                                if valid_texts:
-                                    translated_responses = [self._translate_gemini_message(t) for t in valid_texts]
-                                    translated_response = "\n".join(translated_responses)
-                                else:
-                                    translated_response = "图片编辑失败，请稍后再试或修改描述"
+                    # 再发送图片，直接从内存发送
+                    edited_image_buf = BytesIO(result_image)
+                    edited_image_buf.name = "gemini_edited.png"
+                    e_context["channel"].send(Reply(ReplyType.IMAGE, edited_image_buf), e_context["context"])
+                    e_context.action = EventAction.BREAK_PASS
+                else:
+                    # 检查是否有文本响应，可能是内容被拒绝
+                    if text_response:
+                        # 确保translated_response是字符串
+                        if isinstance(text_response, list):
+                            valid_texts = [t for t in text_response if t]
+                            if valid_texts:
+                                translated_responses = [self._translate_gemini_message(t) for t in valid_texts]
+                                translated_response = "\n".join(translated_responses)
                             else:
-                                translated_response = self._translate_gemini_message(text_response)
-                            
-                            reply = Reply(ReplyType.TEXT, translated_response)
-                            e_context["channel"].send(reply, e_context["context"])
-                            e_context.action = EventAction.BREAK_PASS
+                                translated_response = "图片编辑失败，请稍后再试或修改描述"
                         else:
-                            reply = Reply(ReplyType.TEXT, "图片编辑失败，请稍后再试或修改描述")
-                            e_context["channel"].send(reply, e_context["context"])
-                            e_context.action = EventAction.BREAK_PASS
-                except Exception as e:
-                    logger.error(f"编辑图片失败: {str(e)}")
-                    logger.exception(e)
-                    reply = Reply(ReplyType.TEXT, f"编辑图片失败: {str(e)}")
-                    e_context["channel"].send(reply, e_context["context"])
-                finally:
-                    # 确保在任何情况下都设置action为BREAK_PASS
-                    e_context.action = EventAction.BREAK_PASS
-                    logger.info("图片编辑命令已处理，设置action为BREAK_PASS")
-                return
+                            translated_response = self._translate_gemini_message(text_response)
+                            
+                        reply = Reply(ReplyType.TEXT, translated_response)
+                        e_context["channel"].send(reply, e_context["context"])
+                        e_context.action = EventAction.BREAK_PASS
+                    else:
+                        reply = Reply(ReplyType.TEXT, "图片编辑失败，请稍后再试或修改描述")
+                        e_context["channel"].send(reply, e_context["context"])
+                        e_context.action = EventAction.BREAK_PASS
+            except Exception as e:
+                logger.error("编辑图片失败: %s", e)
+                logger.debug("异常堆栈", exc_info=True)
+                reply = Reply(ReplyType.TEXT, f"编辑图片失败: {str(e)}")
+                e_context["channel"].send(reply, e_context["context"])
+            finally:
+                # 确保在任何情况下都设置action为BREAK_PASS
+                e_context.action = EventAction.BREAK_PASS
+                logger.info("图片编辑命令已处理，设置action为BREAK_PASS")
+            return
 
         # 检查是否是对话继续（没有前缀命令，但有活跃会话）
         if self.auto_edit and conversation_key in self.conversations:
@@ -576,13 +866,13 @@ class GeminiImage(Plugin):
                     
                     # 发送处理中消息
                     processing_reply = Reply(ReplyType.TEXT, "正在处理您的请求，请稍候...")
-                    e_context["channel"].send(processing_reply, e_context["context"])
+                    self._io_pool.submit(e_context["channel"].send, processing_reply, e_context["context"])
                     
                     # 获取上下文历史
-                    conversation_history = self.conversations[conversation_key]
+                    conversation_history = self._get_conversation(conversation_key)
                     
                     # 尝试编辑图片
-                    with open(last_image_path, "rb") as f:
+                    with open(last_image_path, "rb", buffering=1 << 20) as f:
                         image_data = f.read()
                     
                     # 编辑图片
@@ -593,13 +883,12 @@ class GeminiImage(Plugin):
                         reply_text = text_response if text_response else "图片修改成功！"
                         
                         # 将回复文本添加到文件名中
-                        clean_text = reply_text.replace("/", "_").replace("\\", "_").replace(":", "_").replace("*", "_")
+                        clean_text = reply_text.translate(self._SAFE_FN_TABLE)
                         clean_text = clean_text[:30] + "..." if len(clean_text) > 30 else clean_text
                         
-                        new_image_path = os.path.join(self.save_dir, f"gemini_{int(time.time())}_{uuid.uuid4().hex[:8]}_{clean_text}.png")
-                        with open(new_image_path, "wb") as f:
-                            f.write(result_image)
-                        
+                        new_image_path = f"{self._path_prefix}gemini_{int(time.time())}_{uuid.uuid4().hex[:8]}_{clean_text}.png"
+                        self._save_image_async(new_image_path, result_image)
+
                         # 更新最后生成的图片路径 - 对于编辑功能，保持单个路径更简单
                         self.last_images[conversation_key] = new_image_path
                         logger.info(f"更新最后编辑的图片路径: {new_image_path}")
@@ -609,7 +898,7 @@ class GeminiImage(Plugin):
                             "role": "user", 
                             "parts": [
                                 {"text": content},
-                                {"image_url": last_image_path}
+                                {"image_url": last_image_path, "_bytes": image_data}
                             ]
                         }
                         conversation_history.append(user_message)
@@ -619,25 +908,22 @@ class GeminiImage(Plugin):
                             "role": "model", 
                             "parts": [
                                 {"text": text_response if text_response else "我已编辑了图片"},
-                                {"image_url": new_image_path}
+                                {"image_url": new_image_path, "_bytes": result_image}
                             ]
                         }
                         conversation_history.append(assistant_message)
                         
-                        # 限制会话历史长度
-                        if len(conversation_history) > 10:
-                            conversation_history = conversation_history[-10:]
-                        
                         # 更新会话时间戳
-                        self.conversation_timestamps[conversation_key] = time.time()
+                        self.conversation_timestamps[conversation_key] = time.monotonic()
                         
                         # 先发送文本消息
                         cleaned_reply_text = reply_text.strip()
                         e_context["channel"].send(Reply(ReplyType.TEXT, cleaned_reply_text), e_context["context"])
                         
-                        # 再发送图片
-                        new_image_file = open(new_image_path, "rb")
-                        e_context["channel"].send(Reply(ReplyType.IMAGE, new_image_file), e_context["context"])
+                        # 再发送图片，直接从内存发送
+                        new_image_buf = BytesIO(result_image)
+                        new_image_buf.name = "gemini_edited.png"
+                        e_context["channel"].send(Reply(ReplyType.IMAGE, new_image_buf), e_context["context"])
                         e_context.action = EventAction.BREAK_PASS
                     else:
                         # 检查是否有文本响应，可能是内容被拒绝
@@ -661,8 +947,8 @@ class GeminiImage(Plugin):
                             e_context["channel"].send(reply, e_context["context"])
                             e_context.action = EventAction.BREAK_PASS
                 except Exception as e:
-                    logger.error(f"对话继续生成图片失败: {str(e)}")
-                    logger.exception(e)
+                    logger.error("对话继续生成图片失败: %s", e)
+                    logger.debug("异常堆栈", exc_info=True)
                     reply = Reply(ReplyType.TEXT, f"处理失败: {str(e)}")
                     e_context["channel"].send(reply, e_context["context"])
                 finally:
@@ -670,52 +956,52 @@ class GeminiImage(Plugin):
                     e_context.action = EventAction.BREAK_PASS
                     logger.info("对话继续命令已处理，设置action为BREAK_PASS")
             except Exception as e:
-                logger.error(f"处理对话继续时出错: {str(e)}")
-                logger.exception(e)
+                logger.error("处理对话继续时出错: %s", e)
+                logger.debug("异常堆栈", exc_info=True)
                 reply = Reply(ReplyType.TEXT, f"处理失败: {str(e)}")
                 e_context["channel"].send(reply, e_context["context"])
                 e_context.action = EventAction.BREAK_PASS
             return
     
+    @staticmethod
+    def _resolve_sender_id(msg, session_id: str, is_group: bool) -> Optional[str]:
+        """解析消息发送者ID，群聊和单聊共用同一套属性优先级"""
+        sender_id = None
+        # 优先使用actual_user_id或from_user_id
+        for attr in _PRIMARY_USER_ID_ATTRS:
+            value = getattr(msg, attr, None)
+            if value:
+                sender_id = value
+                logger.info(f"使用{attr}作为发送者ID: {sender_id}")
+                break
+        # 检查是否在群聊中sender_id与session_id相同，如果相同说明获取发送者ID不正确
+        if is_group and sender_id == session_id:
+            # 尝试从其他属性获取发送者ID
+            for attr in _GROUP_USER_ID_ATTRS:
+                value = getattr(msg, attr, None)
+                if value:
+                    sender_id = value
+                    logger.info(f"使用{attr}作为发送者ID: {sender_id}")
+                    break
+        return sender_id
+
     def _handle_image_message(self, e_context: EventContext):
         """处理图片消息，缓存图片数据以备后续编辑使用"""
         context = e_context['context']
         session_id = context["session_id"]
         is_group = context.get("isgroup", False)
-        
+
         # 获取发送者ID，确保群聊和单聊场景都能正确缓存
         sender_id = None
         if 'msg' in context.kwargs:
-            msg = context.kwargs['msg']
-            # 优先使用actual_user_id或from_user_id
-            if hasattr(msg, 'actual_user_id') and msg.actual_user_id:
-                sender_id = msg.actual_user_id
-                logger.info(f"使用actual_user_id作为发送者ID: {sender_id}")
-            elif hasattr(msg, 'from_user_id') and msg.from_user_id:
-                sender_id = msg.from_user_id
-                logger.info(f"使用from_user_id作为发送者ID: {sender_id}")
-            # 检查是否在群聊中sender_id与session_id相同，如果相同说明获取发送者ID不正确
-            if is_group and sender_id == session_id:
-                # 尝试从其他属性获取发送者ID
-                if hasattr(msg, 'sender_id') and msg.sender_id:
-                    sender_id = msg.sender_id
-                    logger.info(f"使用sender_id作为发送者ID: {sender_id}")
-                elif hasattr(msg, 'sender_wxid') and msg.sender_wxid:
-                    sender_id = msg.sender_wxid
-                    logger.info(f"使用sender_wxid作为发送者ID: {sender_id}")
-                elif hasattr(msg, 'self_display_name') and msg.self_display_name:
-                    # 作为最后的备选方案，使用显示名称
-                    sender_id = msg.self_display_name
-                    logger.info(f"使用self_display_name作为发送者ID: {sender_id}")
-        
-        # 记录所有可能的用户标识符，便于调试
-        if 'msg' in context.kwargs and hasattr(context.kwargs['msg'], '__dict__'):
-            user_attrs = {}
-            for attr in ['from_user_id', 'actual_user_id', 'sender_id', 'sender_wxid', 'from_user_nickname', 
-                         'self_display_name', 'other_user_id']:
-                if hasattr(context.kwargs['msg'], attr):
-                    user_attrs[attr] = getattr(context.kwargs['msg'], attr)
-            logger.info(f"消息对象中的用户标识符: {user_attrs}")
+            sender_id = self._resolve_sender_id(context.kwargs['msg'], session_id, is_group)
+
+        # 记录所有可能的用户标识符，便于调试（先判级别，未开DEBUG时不构建dict）
+        if 'msg' in context.kwargs and hasattr(context.kwargs['msg'], '__dict__') and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("消息对象中的用户标识符: %s", {
+                attr: getattr(context.kwargs['msg'], attr)
+                for attr in _DEBUG_USER_ID_ATTRS if hasattr(context.kwargs['msg'], attr)
+            })
         
         # 如果仍然无法获取sender_id，使用session_id的一部分
         if not sender_id:
@@ -747,35 +1033,23 @@ class GeminiImage(Plugin):
                 
                 logger.info(f"从content获取到文件路径: {file_paths}")
                 
-                # 尝试将相对路径转换为绝对路径
-                abs_paths = []
-                for file_path in file_paths:
-                    if not os.path.isabs(file_path):
-                        abs_path = os.path.abspath(file_path)
-                        if os.path.exists(abs_path):
-                            abs_paths.append(abs_path)
-                        else:
-                            abs_paths.append(file_path)  # 保留原路径
-                    else:
-                        abs_paths.append(file_path)
-                
-                # 只有当所有路径都可以转为绝对路径时才替换
-                if len(abs_paths) == len(file_paths):
-                    file_paths = abs_paths
-                    logger.info(f"转换为绝对路径: {abs_paths}")
-                
-                # 读取所有有效文件
+                # 尝试将相对路径转换为绝对路径；纯字符串拼接，不触发stat，
+                # 路径是否存在交由下面的open判定
+                file_paths = [os.path.abspath(file_path) for file_path in file_paths]
+                logger.info(f"转换为绝对路径: {file_paths}")
+
+                # 读取所有有效文件：直接open，省掉每个路径一次exists的stat
                 image_datas = []
                 for file_path in file_paths:
-                    if os.path.exists(file_path):
-                        try:
-                            with open(file_path, 'rb') as f:
-                                image_datas.append(f.read())
-                            logger.info(f"从文件路径读取到图片数据，大小: {len(image_datas[-1])} 字节")
-                        except Exception as e:
-                            logger.error(f"读取图片文件失败: {e}")
-                    else:
+                    try:
+                        # 1MB缓冲整块读入，多MB图片不再拆成大量小read
+                        with open(file_path, 'rb', buffering=1 << 20) as f:
+                            image_datas.append(f.read())
+                        logger.info(f"从文件路径读取到图片数据，大小: {len(image_datas[-1])} 字节")
+                    except FileNotFoundError:
                         logger.warning(f"文件路径不存在: {file_path}")
+                    except Exception as e:
+                        logger.error(f"读取图片文件失败: {e}")
                 
                 # 如果读取到了至少一个图片，使用它们
                 if image_datas:
@@ -784,12 +1058,13 @@ class GeminiImage(Plugin):
             # 尝试从msg对象获取图片数据
             if not image_datas and 'msg' in context.kwargs:
                 msg = context.kwargs['msg']
-                logger.info(f"MSG对象属性: {dir(msg)}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("MSG对象属性: %s", dir(msg))
                 
                 # 检查msg是否有download_image方法
                 if hasattr(msg, 'download_image') and callable(getattr(msg, 'download_image')):
                     try:
-                        image_datas = [msg.download_image() for _ in range(len(file_paths))]
+                        image_datas = [msg.download_image()]
                         logger.info(f"通过download_image方法获取到图片数据")
                     except Exception as e:
                         logger.error(f"download_image方法调用失败: {e}")
@@ -800,22 +1075,22 @@ class GeminiImage(Plugin):
                         msg_data = msg.msg_data
                         logger.info(f"MSG.msg_data: {type(msg_data)}")
                         if isinstance(msg_data, dict) and 'image' in msg_data:
-                            image_datas = [msg_data['image'] for _ in range(len(file_paths))]
+                            image_datas = [msg_data['image']]
                             logger.info(f"从msg_data['image']获取到图片数据")
                         elif isinstance(msg_data, bytes):
-                            image_datas = [msg_data for _ in range(len(file_paths))]
+                            image_datas = [msg_data]
                             logger.info(f"从msg_data(bytes)获取到图片数据")
                     except Exception as e:
                         logger.error(f"获取msg_data失败: {e}")
                 
                 # 检查msg是否有img属性
                 elif hasattr(msg, 'img') and msg.img:
-                    image_datas = [msg.img for _ in range(len(file_paths))]
+                    image_datas = [msg.img]
                     logger.info(f"从msg.img获取到图片数据")
                 
                 # 检查msg是否有文件内容属性
                 elif hasattr(msg, 'content') and isinstance(msg.content, bytes):
-                    image_datas = [msg.content for _ in range(len(file_paths))]
+                    image_datas = [msg.content]
                     logger.info(f"从msg.content获取到图片数据，大小: {sum(len(image_data) for image_data in image_datas)} 字节")
                 
                 # 检查msg对象中可能保存的地址
@@ -829,27 +1104,47 @@ class GeminiImage(Plugin):
                     ]
                     
                     for path in possible_paths:
-                        if os.path.exists(path):
-                            try:
-                                with open(path, 'rb') as f:
-                                    image_datas = [f.read() for _ in range(len(file_paths))]
-                                logger.info(f"从路径 {path} 读取到图片数据，大小: {sum(len(image_data) for image_data in image_datas)} 字节")
-                                break
-                            except Exception as e:
-                                logger.error(f"读取图片 {path} 失败: {e}")
+                        try:
+                            # 候选路径多数不存在，直接open失败比先exists再open少一半stat
+                            with open(path, 'rb', buffering=1 << 20) as f:
+                                image_datas = [f.read()]
+                            logger.info(f"从路径 {path} 读取到图片数据，大小: {sum(len(image_data) for image_data in image_datas)} 字节")
+                            break
+                        except FileNotFoundError:
+                            continue
+                        except Exception as e:
+                            logger.error(f"读取图片 {path} 失败: {e}")
             
             # 验证获取到的图片数据是否有效
             if image_datas and all(len(image_data) > 100 for image_data in image_datas):
-                # 尝试验证图片格式
+                # 尝试验证图片格式；常见格式直接比对文件头魔数，零分配零解码，
+                # 头部识别不了的少见格式再退回PIL校验一次。
+                # 原始bytes原样缓存并直接用于上传，全程不经过PIL重编码
                 try:
                     for image_data in image_datas:
-                        Image.open(BytesIO(image_data))
-                    
-                    # 保存图片到缓存
+                        if _sniff_image_format(image_data) is None:
+                            buf = self._acquire_buffer(image_data)
+                            try:
+                                Image.open(buf)
+                            finally:
+                                self._release_buffer(buf)
+
+                    # 保存图片到缓存并维护倒排索引
+                    index_keys = (session_id, sender_id) if is_group else (sender_id,)
                     self.image_cache[cache_key] = {
                         "content": image_datas,
-                        "timestamp": time.time()
+                        "timestamp": time.monotonic(),
+                        "index_keys": index_keys,
                     }
+                    self.image_cache.move_to_end(cache_key)
+                    self._neg_cache.pop(cache_key, None)
+                    for index_key in index_keys:
+                        self._image_cache_index[index_key].add(cache_key)
+                        self._neg_cache.pop(index_key, None)
+                    
+                    # 超出容量时按LRU淘汰最久未使用的条目
+                    while len(self.image_cache) > self.image_cache_capacity:
+                        self._drop_image_cache_key(next(iter(self.image_cache)))
                     logger.info(f"成功缓存图片数据，大小: {sum(len(image_data) for image_data in image_datas)} 字节，缓存键: {cache_key}")
                     
                     # 静默处理图片，不发送任何提示消息
@@ -858,8 +1153,8 @@ class GeminiImage(Plugin):
             else:
                 logger.warning(f"未获取到有效的图片数据或数据太小: {image_datas[:20] if image_datas else 'None'}")
         except Exception as e:
-            logger.error(f"处理图片消息失败: {str(e)}")
-            logger.exception(e)
+            logger.error("处理图片消息失败: %s", e)
+            logger.debug("异常堆栈", exc_info=True)
     
     def _get_recent_image(self, conversation_key: str) -> Optional[bytes]:
         """获取最近的图片数据，支持群聊和单聊场景
@@ -870,102 +1165,76 @@ class GeminiImage(Plugin):
         Returns:
             Optional[bytes]: 图片数据或None
         """
-        # 尝试从conversation_key直接获取缓存
-        cache_data = self.image_cache.get(conversation_key)
-        if cache_data and time.time() - cache_data["timestamp"] <= self.image_cache_timeout:
-            content = cache_data["content"]
-            # 确保返回的是单个bytes对象而不是列表
-            if isinstance(content, list) and len(content) > 0:
-                logger.info(f"从缓存获取到图片数据列表，使用第一个元素，大小: {len(content[0])} 字节，缓存键: {conversation_key}")
-                return content[0]
-            elif isinstance(content, bytes):
-                logger.info(f"从缓存获取到图片数据，大小: {len(content)} 字节，缓存键: {conversation_key}")
+        # 负缓存：刚查过且未命中的键在短TTL内不再重扫；
+        # 本次查找全程共用这一个monotonic采样
+        now = time.monotonic()
+        miss_time = self._neg_cache.get(conversation_key)
+        if miss_time is not None and now - miss_time < self._neg_cache_ttl:
+            return None
+
+        # 直接命中
+        content = self._image_cache_content(conversation_key, now)
+        if content is not None:
+            logger.info(f"从缓存获取到图片数据，大小: {len(content)} 字节，缓存键: {conversation_key}")
+            return content
+
+        # 倒排索引：conversation_key作为群ID或发送者ID出现过的缓存键
+        for cache_key in tuple(self._image_cache_index.get(conversation_key, ())):
+            content = self._image_cache_content(cache_key, now)
+            if content is not None:
+                logger.info(f"从索引缓存键获取到图片数据，大小: {len(content)} 字节，缓存键: {cache_key}")
                 return content
-            else:
-                logger.warning(f"缓存中的图片数据格式不正确: {type(content)}")
-                return None
-        
-        # 群聊场景：尝试使用当前消息上下文中的发送者ID
-        context = e_context['context'] if 'e_context' in locals() else None
-        if not context and hasattr(self, 'current_context'):
-            context = self.current_context
-            
-        if context and context.get("isgroup", False):
-            sender_id = None
-            if 'msg' in context.kwargs:
-                msg = context.kwargs['msg']
-                # 优先使用actual_user_id或from_user_id
-                if hasattr(msg, 'actual_user_id') and msg.actual_user_id:
-                    sender_id = msg.actual_user_id
-                elif hasattr(msg, 'from_user_id') and msg.from_user_id:
-                    sender_id = msg.from_user_id
-                # 如果sender_id与session_id相同，尝试其他属性
-                if sender_id == context.get("session_id"):
-                    if hasattr(msg, 'sender_id') and msg.sender_id:
-                        sender_id = msg.sender_id
-                    elif hasattr(msg, 'sender_wxid') and msg.sender_wxid:
-                        sender_id = msg.sender_wxid
-                    elif hasattr(msg, 'self_display_name') and msg.self_display_name:
-                        sender_id = msg.self_display_name
-                
-                if sender_id:
-                    # 使用群ID_用户ID格式查找
-                    group_key = f"{context.get('session_id')}_{sender_id}"
-                    cache_data = self.image_cache.get(group_key)
-                    if cache_data and time.time() - cache_data["timestamp"] <= self.image_cache_timeout:
-                        content = cache_data["content"]
-                        # 确保返回的是单个bytes对象而不是列表
-                        if isinstance(content, list) and len(content) > 0:
-                            logger.info(f"从群聊缓存键获取到图片数据列表，使用第一个元素，大小: {len(content[0])} 字节，缓存键: {group_key}")
-                            return content[0]
-                        elif isinstance(content, bytes):
-                            logger.info(f"从群聊缓存键获取到图片数据，大小: {len(content)} 字节，缓存键: {group_key}")
-                            return content
-                        else:
-                            logger.warning(f"群聊缓存中的图片数据格式不正确: {type(content)}")
-                            return None
-        
-        # 遍历所有缓存键，查找匹配的键
-        for cache_key in self.image_cache:
-            if cache_key.startswith(f"{conversation_key}_") or cache_key.endswith(f"_{conversation_key}"):
-                cache_data = self.image_cache.get(cache_key)
-                if cache_data and time.time() - cache_data["timestamp"] <= self.image_cache_timeout:
-                    content = cache_data["content"]
-                    # 确保返回的是单个bytes对象而不是列表
-                    if isinstance(content, list) and len(content) > 0:
-                        logger.info(f"从组合缓存键获取到图片数据列表，使用第一个元素，大小: {len(content[0])} 字节，缓存键: {cache_key}")
-                        return content[0]
-                    elif isinstance(content, bytes):
-                        logger.info(f"从组合缓存键获取到图片数据，大小: {len(content)} 字节，缓存键: {cache_key}")
-                        return content
-                    else:
-                        logger.warning(f"组合缓存中的图片数据格式不正确: {type(content)}")
-                        return None
-            
-        # 如果没有找到，尝试其他方法
+
+        # 组合键拆分后逐段查索引，可能是群ID_用户ID格式
         if '_' in conversation_key:
-            # 拆分组合键，可能是群ID_用户ID格式
-            parts = conversation_key.split('_')
-            for part in parts:
-                cache_data = self.image_cache.get(part)
-                if cache_data and time.time() - cache_data["timestamp"] <= self.image_cache_timeout:
-                    content = cache_data["content"]
-                    # 确保返回的是单个bytes对象而不是列表
-                    if isinstance(content, list) and len(content) > 0:
-                        logger.info(f"从拆分键部分获取到图片数据列表，使用第一个元素，大小: {len(content[0])} 字节，缓存键: {part}")
-                        return content[0]
-                    elif isinstance(content, bytes):
-                        logger.info(f"从拆分键部分获取到图片数据，大小: {len(content)} 字节，缓存键: {part}")
+            for part in conversation_key.split('_'):
+                content = self._image_cache_content(part, now)
+                if content is not None:
+                    logger.info(f"从拆分键部分获取到图片数据，大小: {len(content)} 字节，缓存键: {part}")
+                    return content
+                for cache_key in tuple(self._image_cache_index.get(part, ())):
+                    content = self._image_cache_content(cache_key, now)
+                    if content is not None:
+                        logger.info(f"从拆分键索引获取到图片数据，大小: {len(content)} 字节，缓存键: {cache_key}")
                         return content
-                    else:
-                        logger.warning(f"拆分键部分的图片数据格式不正确: {type(content)}")
-                        return None
-                
+
+        self._neg_cache[conversation_key] = now
         return None
     
+    def _image_cache_content(self, cache_key: str, now: Optional[float] = None) -> Optional[bytes]:
+        """读取并校验单个缓存条目，过期条目当场删除"""
+        cache_data = self.image_cache.get(cache_key)
+        if not cache_data:
+            return None
+        if now is None:
+            now = time.monotonic()
+        if now - cache_data["timestamp"] > self.image_cache_timeout:
+            self._drop_image_cache_key(cache_key)
+            return None
+        content = cache_data["content"]
+        # 确保返回的是单个bytes对象而不是列表
+        if isinstance(content, list) and len(content) > 0:
+            return content[0]
+        if isinstance(content, bytes):
+            return content
+        logger.warning(f"缓存中的图片数据格式不正确: {type(content)}")
+        return None
+    
+    def _drop_image_cache_key(self, cache_key: str):
+        """删除缓存条目并同步清理倒排索引"""
+        cache_data = self.image_cache.pop(cache_key, None)
+        if not cache_data:
+            return
+        for index_key in cache_data.get("index_keys", ()):
+            keys = self._image_cache_index.get(index_key)
+            if keys is not None:
+                keys.discard(cache_key)
+                if not keys:
+                    del self._image_cache_index[index_key]
+    
     def _cleanup_image_cache(self):
         """清理过期的图片缓存"""
-        current_time = time.time()
+        current_time = time.monotonic()
         expired_keys = []
         
         for key, cache_data in self.image_cache.items():
@@ -973,12 +1242,21 @@ class GeminiImage(Plugin):
                 expired_keys.append(key)
         
         for key in expired_keys:
-            del self.image_cache[key]
+            self._drop_image_cache_key(key)
             logger.debug(f"清理过期图片缓存: {key}")
     
+    def _get_conversation(self, conversation_key: str) -> List[Dict]:
+        """获取会话历史，访问时惰性过期，不依赖全量扫描"""
+        timestamp = self.conversation_timestamps.get(conversation_key)
+        if timestamp is not None and time.monotonic() - timestamp > self.conversation_expiry:
+            self.conversations.pop(conversation_key, None)
+            self.conversation_timestamps.pop(conversation_key, None)
+            self.last_images.pop(conversation_key, None)
+        return self.conversations[conversation_key]
+
     def _cleanup_expired_conversations(self):
         """清理过期的会话"""
-        current_time = time.time()
+        current_time = time.monotonic()
         expired_keys = []
         
         for key, timestamp in self.conversation_timestamps.items():
@@ -1007,32 +1285,30 @@ class GeminiImage(Plugin):
             max_age_seconds = max_age_hours * 3600
             deleted_count = 0
             
-            # 遍历save_dir目录下的所有文件
-            for filename in os.listdir(self.save_dir):
-                file_path = os.path.join(self.save_dir, filename)
-                
-                # 跳过目录
-                if os.path.isdir(file_path):
-                    continue
-                    
-                # 检查文件是否为插件生成的图片文件
-                if filename.startswith(("gemini_", "edited_", "temp_")):
+            # 预先展开所有仍被引用的图片路径，循环内做O(1)集合查找
+            in_use_paths = set()
+            for last_image in self.last_images.values():
+                if isinstance(last_image, (list, tuple)):
+                    in_use_paths.update(last_image)
+                elif last_image:
+                    in_use_paths.add(last_image)
+            
+            # scandir返回的DirEntry自带缓存的stat信息，单次遍历完成mtime过滤
+            with os.scandir(self.save_dir) as entries:
+                for entry in entries:
+                    # 只处理插件生成的图片文件
+                    if not entry.name.startswith(("gemini_", "edited_", "temp_")):
+                        continue
                     try:
-                        # 获取文件修改时间
-                        file_mod_time = os.path.getmtime(file_path)
-                        file_age = current_time - file_mod_time
+                        if not entry.is_file():
+                            continue
                         
                         # 如果文件超过最大保留时间，则删除
+                        file_age = current_time - entry.stat().st_mtime
                         if file_age > max_age_seconds:
-                            # 检查文件是否在最后生成的图片路径中
-                            in_use = False
-                            for last_image in self.last_images.values():
-                                if file_path in last_image:
-                                    in_use = True
-                                    break
-                            
+                            file_path = entry.path
                             # 如果文件不在使用中，删除它
-                            if not in_use:
+                            if file_path not in in_use_paths:
                                 os.remove(file_path)
                                 deleted_count += 1
                                 logger.debug(f"清理临时图片文件: {file_path}")
@@ -1044,6 +1320,73 @@ class GeminiImage(Plugin):
         except Exception as e:
             logger.error(f"清理临时文件失败: {str(e)}")
     
+    def _build_processed_history(self, conversation_history: List[Dict]) -> List[Dict]:
+        """把会话历史转换为Gemini contents格式
+
+        历史消息中的image_url会读盘并base64编码；编码结果按(路径, mtime)
+        缓存，同一段历史在多次调用间不重复读盘和编码。
+        """
+        processed_history = []
+        for msg in conversation_history:
+            # 历史消息追加后不再变化，转换结果直接挂在消息上跨轮次复用，
+            # 每轮只需转换新增的那条消息
+            cached = msg.get("_processed")
+            if cached is not None:
+                processed_history.append(cached)
+                continue
+
+            # 转换角色名称，确保使用 "user" 或 "model"
+            role = msg["role"]
+            if role == "assistant":
+                role = "model"
+
+            complete = True
+            processed_msg = {"role": role, "parts": []}
+            for part in msg["parts"]:
+                if "text" in part:
+                    processed_msg["parts"].append({"text": part["text"]})
+                elif "image_url" in part:
+                    # 需要转换为inlineData格式；优先用留在历史里的内存数据，
+                    # 只有字节不在内存时才回读磁盘（下划线键不会进入请求体）
+                    try:
+                        encoded = part.get("_b64")
+                        if encoded is None:
+                            raw = part.get("_bytes")
+                            if raw is not None:
+                                encoded = self._encode_image_base64(raw)
+                            else:
+                                encoded = self._encode_history_image(part["image_url"])
+                            part["_b64"] = encoded
+                        processed_msg["parts"].append({
+                            "inlineData": {
+                                "mimeType": "image/png",
+                                "data": encoded
+                            }
+                        })
+                    except Exception as e:
+                        logger.error(f"处理历史图片失败: {e}")
+                        # 跳过这个图片；瞬时读盘失败不缓存，下一轮可恢复
+                        complete = False
+            if complete:
+                msg["_processed"] = processed_msg
+            processed_history.append(processed_msg)
+        return processed_history
+
+    def _encode_history_image(self, image_path: str) -> str:
+        """读取并base64编码历史图片，结果按(路径, mtime)做LRU缓存"""
+        st = os.stat(image_path)
+        key = (image_path, st.st_mtime_ns)
+        cached = self._history_b64_cache.get(key)
+        if cached is not None:
+            self._history_b64_cache.move_to_end(key)
+            return cached
+        with open(image_path, "rb", buffering=1 << 20) as f:
+            encoded = _b64encode_ascii(f.read())
+        self._history_b64_cache[key] = encoded
+        if len(self._history_b64_cache) > self._history_b64_cache_size:
+            self._history_b64_cache.popitem(last=False)
+        return encoded
+
     def _generate_image(self, prompt: str, conversation_history: List[Dict] = None) -> Tuple[List[Optional[bytes]], List[Optional[str]]]:
         """调用Gemini API生成图片，返回图片数据列表和文本响应列表，以支持图文混排内容
         
@@ -1051,46 +1394,10 @@ class GeminiImage(Plugin):
             Tuple[List[Optional[bytes]], List[Optional[str]]]: 图片数据列表和文本响应列表，
             按照API返回的顺序排列，以支持图文混排内容的处理。
         """
-        url = f"{self.base_url}/v1beta/models/gemini-2.0-flash-exp-image-generation:generateContent"
-        headers = {
-            "Content-Type": "application/json",
-        }
-        
-        params = {
-            "key": self.api_key
-        }
-        
         # 构建请求数据
         if conversation_history and len(conversation_history) > 0:
-            # 有会话历史，构建上下文
-            # 需要处理会话历史中的图片格式
-            processed_history = []
-            for msg in conversation_history:
-                # 转换角色名称，确保使用 "user" 或 "model"
-                role = msg["role"]
-                if role == "assistant":
-                    role = "model"
-                
-                processed_msg = {"role": role, "parts": []}
-                for part in msg["parts"]:
-                    if "text" in part:
-                        processed_msg["parts"].append({"text": part["text"]})
-                    elif "image_url" in part:
-                        # 需要读取图片并转换为inlineData格式
-                        try:
-                            with open(part["image_url"], "rb") as f:
-                                image_data = f.read()
-                                image_base64 = base64.b64encode(image_data).decode("utf-8")
-                                processed_msg["parts"].append({
-                                    "inlineData": {
-                                        "mimeType": "image/png",
-                                        "data": image_base64
-                                    }
-                                })
-                        except Exception as e:
-                            logger.error(f"处理历史图片失败: {e}")
-                            # 跳过这个图片
-                processed_history.append(processed_msg)
+            # 有会话历史，构建上下文（历史图片base64按路径+mtime缓存）
+            processed_history = self._build_processed_history(conversation_history)
             
             data = {
                 "contents": processed_history + [
@@ -1103,79 +1410,65 @@ class GeminiImage(Plugin):
                         ]
                     }
                 ],
-                "generation_config": {
-                    "response_modalities": ["Text", "Image"]
-                }
+                "generation_config": self._generation_config
             }
         else:
-            # 无会话历史，直接使用提示
-            data = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                "generation_config": {
-                    "response_modalities": ["Text", "Image"]
-                }
-            }
-        
-        # 创建代理配置
-        proxies = None
-        if self.enable_proxy and self.proxy_url:
-            proxies = {
-                "http": self.proxy_url,
-                "https": self.proxy_url
-            }
+            # 无会话历史：提示词之外全是常量，直接用预序列化模板得到请求字节，
+            # 跳过整棵嵌套dict的构建和序列化
+            data = self._nohist_body_tmpl % json.dumps(prompt, ensure_ascii=False).encode("utf-8")
         
         try:
             # 发送请求
             logger.info(f"开始调用Gemini API生成图片")
-            response = requests.post(
-                url, 
-                headers=headers, 
-                params=params, 
-                json=data,
-                proxies=proxies,
-                timeout=120  # 增加超时时间到120秒，解决多图文任务超时问题
-            )
-            
-            logger.info(f"Gemini API响应状态码: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                # 记录完整响应内容，方便调试
-                logger.debug(f"Gemini API响应内容: {result}")
+            status_code, result, error_text = self._call_gemini_api(data)
+
+            logger.info(f"Gemini API响应状态码: {status_code}")
+
+            if status_code == 200:
+                # 记录完整响应内容，方便调试；%s占位延迟格式化，
+                # DEBUG未开启时不对多MB的响应dict做repr
+                logger.debug("Gemini API响应内容: %s", result)
                 
                 # 提取响应
-                candidates = result.get("candidates", [])
-                if candidates and len(candidates) > 0:
-                    content = candidates[0].get("content", {})
-                    parts = content.get("parts", [])
-                    
-                    # 处理文本和图片响应，以列表形式返回所有部分
+                candidates = result.get("candidates")
+                if candidates:
+                    # 汇总所有candidate的parts，支持candidateCount>1时的批量返回；
+                    # 正常响应必有content.parts，直接取下标免去每层get的默认值分配
+                    parts = []
+                    extend_parts = parts.extend
+                    for candidate in candidates:
+                        try:
+                            extend_parts(candidate["content"]["parts"])
+                        except KeyError:
+                            continue
+
+                    # 处理文本和图片响应，以列表形式返回所有部分。
+                    # 方法引用提升为局部名，每字段只做一次dict查找
                     text_responses = []
                     image_datas = []
-                    
+                    b64decode = _b64decode
+                    append_text = text_responses.append
+                    append_image = image_datas.append
+
                     for part in parts:
                         # 处理文本部分
-                        if "text" in part and part["text"]:
-                            text_responses.append(part["text"])
-                            image_datas.append(None)  # 对应位置添加None表示没有图片
-                        
+                        text = part.get("text")
+                        if text:
+                            append_text(text)
+                            append_image(None)  # 对应位置添加None表示没有图片
+                            continue
+
                         # 处理图片部分
-                        elif "inlineData" in part:
-                            inline_data = part.get("inlineData", {})
-                            if inline_data and "data" in inline_data:
-                                # Base64解码图片数据
-                                img_data = base64.b64decode(inline_data["data"])
-                                image_datas.append(img_data)
-                                text_responses.append(None)  # 对应位置添加None表示没有文本
+                        inline_data = part.get("inlineData")
+                        if inline_data:
+                            data_b64 = inline_data.get("data")
+                            if data_b64:
+                                # Base64解码图片数据，随后立刻释放原始base64字符串，
+                                # 避免图片在响应dict和解码结果里双份驻留
+                                img_data = b64decode(data_b64)
+                                inline_data["data"] = None
+                                append_image(img_data)
+                                append_text(None)  # 对应位置添加None表示没有文本
                     
                     # 检查是否有图片数据
                     if not image_datas or all(img is None for img in image_datas):
@@ -1205,26 +1498,26 @@ class GeminiImage(Plugin):
                 logger.error(f"未找到生成的图片数据: {result}")
                 return [], []
             else:
-                logger.error(f"Gemini API调用失败 (状态码: {response.status_code}): {response.text}")
+                logger.error(f"Gemini API调用失败 (状态码: {status_code}): {error_text}")
                 return [], []
-        except requests.exceptions.SSLError as e:
-            logger.error(f"API调用SSL错误: {str(e)}")
-            logger.exception(e)
+        except SSL_ERRORS as e:
+            logger.error("API调用SSL错误: %s", e)
+            logger.debug("异常堆栈", exc_info=True)
             return [], [f"图片生成失败: SSL连接错误，请检查网络或代理设置: {str(e)}"]
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"API调用连接错误: {str(e)}")
-            logger.exception(e)
+        except CONNECTION_ERRORS as e:
+            logger.error("API调用连接错误: %s", e)
+            logger.debug("异常堆栈", exc_info=True)
             return [], [f"图片生成失败: 连接错误，请检查网络或代理设置: {str(e)}"]
-        except requests.exceptions.Timeout as e:
-            logger.error(f"API调用超时: {str(e)}")
-            logger.exception(e)
+        except TIMEOUT_ERRORS as e:
+            logger.error("API调用超时: %s", e)
+            logger.debug("异常堆栈", exc_info=True)
             return [], [f"图片生成失败: API调用超时，请稍后再试: {str(e)}"]
         except Exception as e:
-            logger.error(f"API调用异常: {str(e)}")
-            logger.exception(e)
+            logger.error("API调用异常: %s", e)
+            logger.debug("异常堆栈", exc_info=True)
             return [], [f"图片生成失败: {str(e)}"]
     
-    def _edit_image(self, prompt: str, image_data_input: Union[bytes, List[bytes]], conversation_history: List[Dict] = None) -> Tuple[Optional[bytes], Optional[str]]:
+    def _edit_image(self, prompt: str, image_data_input: Union[bytes, List[bytes]], conversation_history: List[Dict] = None, mime_type: Optional[str] = None) -> Tuple[Optional[bytes], Optional[str]]:
         """调用Gemini API编辑图片，返回处理后的图片数据和文本响应
         
         Args:
@@ -1236,15 +1529,6 @@ class GeminiImage(Plugin):
             Tuple[Optional[bytes], Optional[str]]: 编辑后的图片数据和文本响应。
             如果API返回了多个结果，会选择第一个有效的图片和文本。
         """
-        url = f"{self.base_url}/v1beta/models/gemini-2.0-flash-exp-image-generation:generateContent"
-        headers = {
-            "Content-Type": "application/json",
-        }
-        
-        params = {
-            "key": self.api_key
-        }
-        
         # 确保image_data_input是列表形式
         if isinstance(image_data_input, bytes):
             image_datas = [image_data_input]
@@ -1256,237 +1540,159 @@ class GeminiImage(Plugin):
             logger.error("没有提供图片数据")
             return None, None
         
-        # 将图片数据转换为Base64编码
-        image_base64 = base64.b64encode(image_datas[0]).decode("utf-8")  # 使用第一张图片
-        
-        # 构建请求数据
-        if conversation_history and len(conversation_history) > 0:
-            # 有会话历史，构建上下文
-            # 需要处理会话历史中的图片格式
-            processed_history = []
-            for msg in conversation_history:
-                # 转换角色名称，确保使用 "user" 或 "model"
-                role = msg["role"]
-                if role == "assistant":
-                    role = "model"
-                
-                processed_msg = {"role": role, "parts": []}
-                for part in msg["parts"]:
-                    if "text" in part:
-                        processed_msg["parts"].append({"text": part["text"]})
-                    elif "image_url" in part:
-                        # 需要读取图片并转换为inlineData格式
-                        try:
-                            with open(part["image_url"], "rb") as f:
-                                img_data = f.read()
-                                img_base64 = base64.b64encode(img_data).decode("utf-8")
-                                processed_msg["parts"].append({
-                                    "inlineData": {
-                                        "mimeType": "image/png",
-                                        "data": img_base64
-                                    }
-                                })
-                        except Exception as e:
-                            logger.error(f"处理历史图片失败: {e}")
-                            # 跳过这个图片
-                processed_history.append(processed_msg)
+        # 将图片数据转换为Base64编码（带缓存，重试/连续编辑同一图片时不重复编码）
+        image_base64 = self._encode_image_base64(image_datas[0])  # 使用第一张图片
 
-            data = {
-                "contents": processed_history + [
-                    {
-                        "role": "user",
-                        "parts": [
-                            {
-                                "text": prompt
-                            },
-                            {
-                                "inlineData": {
-                                    "mimeType": "image/png",
-                                    "data": image_base64
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "generation_config": {
-                    "response_modalities": ["Text", "Image"]
+        # 缓存的是用户上传的原始字节，从文件头识别真实格式按原样上报，
+        # 不做任何PNG转码；识别不了时保持原先的png声明
+        if mime_type is None:
+            image_format = _sniff_image_format(image_datas[0])
+            mime_type = f"image/{image_format}" if image_format else "image/png"
+        
+        # 构建请求数据；有无历史只影响contents前缀，主体构建路径合一
+        parts = [
+            {
+                "text": prompt
+            },
+            {
+                "inlineData": {
+                    "mimeType": mime_type,
+                    "data": image_base64
                 }
             }
+        ]
+        if conversation_history:
+            # 有会话历史，构建上下文（历史图片base64按路径+mtime缓存）
+            processed_history = self._build_processed_history(conversation_history)
+            contents = processed_history + [{"role": "user", "parts": parts}]
         else:
             # 无会话历史，直接使用提示和图片
-            data = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            },
-                            {
-                                "inlineData": {
-                                    "mimeType": "image/png",
-                                    "data": image_base64
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "generation_config": {
-                    "response_modalities": ["Text", "Image"]
-                }
-            }
-        
-        # 创建代理配置
-        proxies = None
-        if self.enable_proxy and self.proxy_url:
-            proxies = {
-                "http": self.proxy_url,
-                "https": self.proxy_url
-            }
-        
+            contents = [{"parts": parts}]
+        data = {
+            "contents": contents,
+            "generation_config": self._edit_generation_config
+        }
+
         try:
             # 发送请求
             logger.info(f"开始调用Gemini API编辑图片")
-            response = requests.post(
-                url, 
-                headers=headers, 
-                params=params, 
-                json=data,
-                proxies=proxies,
-                timeout=120  # 增加超时时间到120秒，解决多图文任务超时问题
-            )
-            
-            logger.info(f"Gemini API响应状态码: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                # 记录完整响应内容，方便调试
-                logger.debug(f"Gemini API响应内容: {result}")
+            status_code, result, error_text = self._call_gemini_api(data, sniff_image_safety=True)
+
+            logger.info(f"Gemini API响应状态码: {status_code}")
+
+            if status_code == 200:
+                if result is None:
+                    # 未解析即在字节层命中IMAGE_SAFETY，原文返回给上层翻译
+                    logger.warning("Gemini API返回IMAGE_SAFETY，图片内容可能违反安全政策")
+                    return None, error_text
+
+                # 记录完整响应内容，方便调试；%s占位延迟格式化，
+                # DEBUG未开启时不对多MB的响应dict做repr
+                logger.debug("Gemini API响应内容: %s", result)
                 
                 # 检查是否有内容安全问题
-                candidates = result.get("candidates", [])
-                if candidates and len(candidates) > 0:
-                    finish_reason = candidates[0].get("finishReason", "")
-                    if finish_reason == "IMAGE_SAFETY":
+                candidates = result.get("candidates")
+                if candidates:
+                    first_candidate = candidates[0]
+                    if first_candidate.get("finishReason") == "IMAGE_SAFETY":
                         logger.warning("Gemini API返回IMAGE_SAFETY，图片内容可能违反安全政策")
                         return None, json.dumps(result)  # 返回整个响应作为错误信息
-                    
-                    content = candidates[0].get("content", {})
-                    parts = content.get("parts", [])
-                    
-                    # 处理文本和图片响应，以列表形式返回所有部分
-                    text_responses = []
-                    image_datas = []
-                    
+
+                    try:
+                        parts = first_candidate["content"]["parts"]
+                    except KeyError:
+                        parts = ()
+
+                    # 编辑路径只需要第一个有效图片和文本：单趟扫描直接取，
+                    # 不构建None填充的配对列表，也不解码用不到的后续图片
+                    first_image = None
+                    first_text = None
                     for part in parts:
                         # 处理文本部分
-                        if "text" in part and part["text"]:
-                            text_responses.append(part["text"])
-                            image_datas.append(None)  # 对应位置添加None表示没有图片
-                        
+                        if first_text is None:
+                            text = part.get("text")
+                            if text:
+                                first_text = text
+                                if first_image is not None:
+                                    break
+                                continue
                         # 处理图片部分
-                        elif "inlineData" in part:
-                            inline_data = part.get("inlineData", {})
-                            if inline_data and "data" in inline_data:
-                                # Base64解码图片数据
-                                img_data = base64.b64decode(inline_data["data"])
-                                image_datas.append(img_data)
-                                text_responses.append(None)  # 对应位置添加None表示没有文本
-                    
-                    if not image_datas or all(img is None for img in image_datas):
+                        if first_image is None:
+                            inline_data = part.get("inlineData")
+                            if inline_data:
+                                data_b64 = inline_data.get("data")
+                                if data_b64:
+                                    # Base64解码图片数据，随后立刻释放原始base64字符串
+                                    first_image = _b64decode(data_b64)
+                                    inline_data["data"] = None
+                                    if first_text is not None:
+                                        break
+
+                    if first_image is None:
                         logger.error(f"API响应中没有找到图片数据: {result}")
-                        # 检查是否有文本响应，仅返回文本数据
-                        if text_responses and any(text is not None for text in text_responses):
-                            # 获取第一个有效的文本响应
-                            valid_text = next((t for t in text_responses if t), None)
-                            return None, valid_text  # 返回None表示没有图片, 和第一个有效文本
-                        return None, None
-                    
-                    # 获取第一个有效的图片和文本
-                    first_valid_image = next((img for img in image_datas if img), None)
-                    first_valid_text = next((text for text in text_responses if text), None)
-                    
-                    return first_valid_image, first_valid_text
+                        # 返回None表示没有图片, 和第一个有效文本（可能同为None）
+                        return None, first_text
+
+                    return first_image, first_text
                 
                 logger.error(f"未找到编辑后的图片数据: {result}")
                 return None, None
             else:
-                logger.error(f"Gemini API调用失败 (状态码: {response.status_code}): {response.text}")
+                logger.error(f"Gemini API调用失败 (状态码: {status_code}): {error_text}")
                 return None, None
-        except requests.exceptions.SSLError as e:
-            logger.error(f"API调用SSL错误: {str(e)}")
-            logger.exception(e)
+        except SSL_ERRORS as e:
+            logger.error("API调用SSL错误: %s", e)
+            logger.debug("异常堆栈", exc_info=True)
             return None, f"图片编辑失败: SSL连接错误，请检查网络或代理设置: {str(e)}"
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"API调用连接错误: {str(e)}")
-            logger.exception(e)
+        except CONNECTION_ERRORS as e:
+            logger.error("API调用连接错误: %s", e)
+            logger.debug("异常堆栈", exc_info=True)
             return None, f"图片编辑失败: 连接错误，请检查网络或代理设置: {str(e)}"
-        except requests.exceptions.Timeout as e:
-            logger.error(f"API调用超时: {str(e)}")
-            logger.exception(e)
+        except TIMEOUT_ERRORS as e:
+            logger.error("API调用超时: %s", e)
+            logger.debug("异常堆栈", exc_info=True)
             return None, f"图片编辑失败: API调用超时，请稍后再试: {str(e)}"
         except Exception as e:
-            logger.error(f"API调用异常: {str(e)}")
-            logger.exception(e)
+            logger.error("API调用异常: %s", e)
+            logger.debug("异常堆栈", exc_info=True)
             return None, f"图片编辑失败: {str(e)}"
     
-    def _translate_gemini_message(self, text: str) -> str:
-        """将Gemini API的英文消息翻译成中文"""
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _translate_gemini_message(text: str) -> str:
+        """将Gemini API的英文消息翻译成中文：一趟扫描收齐关键词，查规则表分类
+
+        安全拒绝消息是一个反复出现的有限集合，结果按输入串LRU缓存，
+        重复消息不再扫描。
+        """
         if not text:
             return ""
-            
-        # 内容安全过滤消息
-        if "finishReason" in text and "IMAGE_SAFETY" in text:
-            return "抱歉，您的请求可能违反了内容安全政策，无法生成或编辑图片。请尝试修改您的描述，提供更为安全、合规的内容。"
-        
-        # 处理API响应中的特定错误
-        if "finishReason" in text:
-            return "抱歉，图片处理失败，请尝试其他描述或稍后再试。"
-            
-        # 常见的内容审核拒绝消息翻译
-        if "I'm unable to create this image" in text:
-            if "sexually suggestive" in text:
-                return "抱歉，我无法创建这张图片。我不能生成带有性暗示或促进有害刻板印象的内容。请提供其他描述。"
-            elif "harmful" in text or "dangerous" in text:
-                return "抱歉，我无法创建这张图片。我不能生成可能有害或危险的内容。请提供其他描述。"
-            elif "violent" in text:
-                return "抱歉，我无法创建这张图片。我不能生成暴力或血腥的内容。请提供其他描述。"
-            else:
-                return "抱歉，我无法创建这张图片。请尝试修改您的描述，提供其他内容。"
-        
-        # 其他常见拒绝消息
-        if "cannot generate" in text or "can't generate" in text:
-            return "抱歉，我无法生成符合您描述的图片。请尝试其他描述。"
-        
-        if "against our content policy" in text:
-            return "抱歉，您的请求违反了内容政策，无法生成相关图片。请提供其他描述。"
-        
-        # 保留原始文本格式
+
+        hits = {m.lastgroup for m in GeminiImage._REASON_RE.finditer(text)}
+        if hits:
+            for needles, reply in GeminiImage._TRANSLATE_RULES:
+                if needles <= hits:
+                    return reply
+
+        # 未命中任何完整规则，保留原始文本格式
         return text
     
     def _load_config_template(self):
-        """加载配置模板"""
+        """加载配置模板，解析结果缓存在类上，只读盘解析一次"""
+        cached = GeminiImage._config_template_cache
+        if cached is not None:
+            # 调用方会就地补默认值，返回拷贝避免污染缓存
+            return copy.deepcopy(cached)
         try:
             template_path = os.path.join(os.path.dirname(__file__), "config.json.template")
             if os.path.exists(template_path):
                 with open(template_path, "r", encoding="utf-8") as f:
                     plugin_conf = json.load(f)
-                    return plugin_conf
+                    GeminiImage._config_template_cache = plugin_conf
+                    return copy.deepcopy(plugin_conf)
         except Exception as e:
             logger.exception(e)
             return self.DEFAULT_CONFIG
     
     def get_help_text(self, verbose=False, **kwargs):
-        help_text = "基于Google Gemini的图像生成插件\n"
-        help_text += "支持以下命令：\n"
-        help_text += f"1. 生成图片：{' 或 '.join(self.commands)} [描述]\n"
-        help_text += f"2. 编辑图片：{' 或 '.join(self.edit_commands)} [描述]\n"
-        help_text += f"3. 结束对话：{' 或 '.join(self.exit_commands)}\n\n"
-        
-        if verbose:
-            help_text += "使用说明：\n"
-            help_text += "- 生成图片后会开始一个会话，可以通过发送命令继续修改图片\n"
-            help_text += "- 每个会话的有效期为10分钟，超时需要重新开始\n"
-            help_text += "- 发送结束对话命令可以立即结束当前会话\n"
-        
-        return help_text 
\ No newline at end of file
+        return self._help_text_verbose if verbose else self._help_text_brief
\ No newline at end of file